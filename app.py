@@ -1,135 +1,271 @@
 import streamlit as st
 import pandas as pd
-import requests
+import httpx
 import time
 import hmac
 import hashlib
 import base64
 import json
+import random
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, Dict, List
+from functools import lru_cache, partial
+from types import MappingProxyType
+from typing import Optional, Dict, List, Tuple
 import io
-import urllib3
+import re
+import math
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import xlsxwriter
 
-# SSL 경고 제거
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# JSON 직렬화: orjson 이 있으면 사용 (없으면 표준 json)
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    _json_loads = json.loads
 
 # 설정
 BASE_URL = 'https://api.searchad.naver.com'
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+# 입찰가 조회 1회 요청당 키워드 수 (키워드당 5개 순위 항목)
+BID_BATCH_SIZE = 20
+# 조회 결과 캐시 (초 단위 유효시간, 최대 키워드 수)
+RESULT_CACHE_TTL = 600
+RESULT_CACHE_MAX_ENTRIES = 10000
+# 캐시된 API 객체 (초 단위 유효시간, 최대 인증 정보 수)
+API_CLIENT_TTL = 3600
+API_CLIENT_MAX_ENTRIES = 32
+# 진행률 UI 최소 갱신 간격 (초)
+UI_UPDATE_INTERVAL = 0.25
+
+# 입찰가 컬럼명 (디바이스별 1-5위)
+BID_POSITIONS = (1, 2, 3, 4, 5)
+PC_COLS = tuple(f"PC {pos}위" for pos in BID_POSITIONS)
+MOBILE_COLS = tuple(f"MOBILE {pos}위" for pos in BID_POSITIONS)
+BID_COLS = PC_COLS + MOBILE_COLS
+
+# 결과 컬럼 순서
+RESULT_COLS = (
+    "키워드", "PC 검색량", "모바일 검색량", "총 검색량",
+    "PC 클릭률", "모바일 클릭률", "경쟁도",
+    *BID_COLS
+)
+_BID_COL_BY_POSITION = {
+    'PC': dict(zip(BID_POSITIONS, PC_COLS)),
+    'MOBILE': dict(zip(BID_POSITIONS, MOBILE_COLS))
+}
+
+# 입찰가 조회 실패 시 사용하는 빈 결과 (읽기 전용)
+_EMPTY_BIDS = {
+    device: MappingProxyType(dict.fromkeys(col_by_pos.values()))
+    for device, col_by_pos in _BID_COL_BY_POSITION.items()
+}
+
+# 키워드 정제용 정규식 (\w 는 str.isalnum() 문자와 '_' 를 포함)
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w .\-]')
+
+# 숫자 추출용 정규식
+_NUM_RE = re.compile(r'[0-9.]+')
 
 # 속도 모드 설정 (tkinter 버전과 동일)
 SPEED_MODES = {
     0: {
         'name': '🐢 초안전모드',
         'calls_per_second': 1.5,
+        'max_concurrency': 3,
         'timeout': 30,
         'retry_count': 2,
-        'wait_between_retries': [5, 15]
+        'retry_base': 5.0,
+        'retry_cap': 60.0
     },
     1: {
         'name': '🐌 안전모드',
         'calls_per_second': 2.5,
+        'max_concurrency': 5,
         'timeout': 25,
         'retry_count': 3,
-        'wait_between_retries': [5, 10, 20]
+        'retry_base': 5.0,
+        'retry_cap': 60.0
     },
     2: {
         'name': '⚖️ 균형모드',
         'calls_per_second': 4.0,
+        'max_concurrency': 8,
         'timeout': 20,
         'retry_count': 3,
-        'wait_between_retries': [3, 8, 15]
+        'retry_base': 3.0,
+        'retry_cap': 60.0
     },
     3: {
         'name': '🚗 고속모드',
         'calls_per_second': 6.0,
+        'max_concurrency': 12,
         'timeout': 15,
         'retry_count': 2,
-        'wait_between_retries': [2, 8]
+        'retry_base': 2.0,
+        'retry_cap': 60.0
     },
     4: {
         'name': '🚀 초고속모드',
         'calls_per_second': 8.0,
+        'max_concurrency': 16,
         'timeout': 12,
         'retry_count': 2,
-        'wait_between_retries': [2, 5]
+        'retry_base': 2.0,
+        'retry_cap': 60.0
     }
 }
 
+@lru_cache(maxsize=4096)
+def _clean_keyword(keyword: str) -> str:
+    """키워드 정제 (tkinter 버전과 동일)"""
+    if not keyword:
+        return ""
+    
+    # 기본 정제 + 연속 공백 제거
+    cleaned = _MULTI_SPACE_RE.sub(' ', keyword.strip())
+    
+    # 허용 문자만 남기기 (한글, 영문, 숫자, 공백, 기본 특수문자)
+    result = _DISALLOWED_CHARS_RE.sub('', cleaned).strip()
+    
+    # 길이 제한
+    if len(result) > 50:
+        result = result[:50].strip()
+    
+    return result
+
+class TokenBucket:
+    """스레드 간 공유되는 토큰 버킷 (capacity 만큼 연속 호출 허용)"""
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def consume(self, tokens: float = 1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.last_refill
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+                self.last_refill = now
+                
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                
+                wait_time = (tokens - self.tokens) / self.refill_rate
+            
+            # 락 밖에서 대기해 다른 작업자의 토큰 계산을 막지 않음
+            time.sleep(wait_time)
+
+def backoff_wait(attempt: int, mode_config: dict):
+    """지수 백오프 + 지터 (마지막 시도 후에는 대기하지 않음)"""
+    if attempt + 1 >= mode_config['retry_count']:
+        return
+    base = mode_config['retry_base']
+    wait_time = min(mode_config['retry_cap'], base * (2 ** attempt)) + random.uniform(0, base)
+    time.sleep(wait_time)
+
+class ResultCache:
+    """키워드별 조회 결과 캐시 (TTL 만료 + 최대 개수 초과 시 오래된 항목부터 제거)"""
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            
+            self.entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """세션 간 공유되는 결과 캐시"""
+    return ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+
+def _normalize_echo(keyword: str) -> str:
+    """응답 키워드 확인용 정규화 (대소문자/공백 차이 무시)"""
+    return keyword.replace(' ', '').casefold()
+
 class NaverKeywordAPI:
     def __init__(self, customer_id: str, access_key: str, secret_key: str):
         self.customer_id = customer_id
         self.access_key = access_key
         self.secret_key = secret_key
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': USER_AGENT,
-            'Accept': 'application/json',
-            'Connection': 'keep-alive'
-        })
+        self._secret_bytes = secret_key.encode('utf-8')
+        # 캐시 키용 계정 식별자 (secret key 포함, 인증 정보 원문은 키에 남기지 않음)
+        self.account_hash = hashlib.sha256('\0'.join((customer_id, access_key, secret_key)).encode('utf-8')).hexdigest()[:16]
+        # HTTP/2 로 동시 요청을 하나의 연결에 다중화
+        self.session = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            headers={
+                'Content-Type': 'application/json; charset=UTF-8',
+                'X-API-KEY': access_key,
+                'X-Customer': customer_id,
+                'User-Agent': USER_AGENT,
+                'Accept': 'application/json'
+            }
+        )
+        # 캐시에서 제거된 객체가 회수되면 연결 풀도 닫음
+        weakref.finalize(self, self.session.close)
         
     def generate_signature(self, method: str, uri: str, timestamp: str) -> str:
         """시그니처 생성"""
-        message = f"{timestamp}.{method}.{uri}"
-        hashed = hmac.new(self.secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256)
-        return base64.b64encode(hashed.digest()).decode('utf-8')
+        message = f"{timestamp}.{method}.{uri}".encode('ascii')
+        digest = hmac.digest(self._secret_bytes, message, 'sha256')
+        return base64.b64encode(digest).decode('ascii')
     
     def clean_keyword(self, keyword: str) -> str:
         """키워드 정제 (tkinter 버전과 동일)"""
-        if not keyword:
-            return ""
-        
-        # 기본 정제
-        cleaned = keyword.strip()
-        
-        # 연속 공백 제거
-        while '  ' in cleaned:
-            cleaned = cleaned.replace('  ', ' ')
-        
-        # 허용 문자만 남기기 (한글, 영문, 숫자, 공백, 기본 특수문자)
-        allowed_chars = ''
-        for char in cleaned:
-            if char.isalnum() or char in 'ㄱ-ㅎㅏ-ㅣ가-힣 .-_':
-                allowed_chars += char
-        
-        # 길이 제한
-        result = allowed_chars.strip()
-        if len(result) > 50:
-            result = result[:50].strip()
-        
-        return result
+        return _clean_keyword(keyword)
     
-    def fetch_keyword_data(self, keyword: str, mode_config: dict) -> Optional[Dict]:
-        """키워드 데이터 조회 (간소화된 로그)"""
+    def fetch_keyword_data(self, cleaned_keyword: str, mode_config: dict, bucket: TokenBucket) -> Optional[Dict]:
+        """키워드 데이터 조회 (정제된 키워드 기준)"""
         uri = '/keywordstool'
         
-        # 키워드 정제
-        cleaned_keyword = self.clean_keyword(keyword)
         if not cleaned_keyword:
             return None
         
         # 재시도 로직
         for attempt in range(mode_config['retry_count']):
             try:
-                if attempt > 0:
-                    wait_time = mode_config['wait_between_retries'][min(attempt-1, len(mode_config['wait_between_retries'])-1)]
-                    time.sleep(wait_time)
-                
                 # 요청 간격 제어
-                time.sleep(1.0 / mode_config['calls_per_second'])
+                bucket.consume(1)
                 
                 timestamp = str(int(time.time() * 1000))
                 signature = self.generate_signature('GET', uri, timestamp)
                 
+                # 고정 헤더는 세션에 설정되어 있으므로 요청별 값만 전달
                 headers = {
-                    'Content-Type': 'application/json; charset=UTF-8',
                     'X-Timestamp': timestamp,
-                    'X-API-KEY': self.access_key,
-                    'X-Customer': self.customer_id,
-                    'X-Signature': signature,
-                    'User-Agent': USER_AGENT,
-                    'Accept': 'application/json'
+                    'X-Signature': signature
                 }
                 
                 params = {
@@ -141,13 +277,12 @@ class NaverKeywordAPI:
                     BASE_URL + uri,
                     headers=headers,
                     params=params,
-                    timeout=mode_config['timeout'],
-                    verify=True
+                    timeout=mode_config['timeout']
                 )
                 
                 if response.status_code == 200:
                     try:
-                        json_data = response.json()
+                        json_data = _json_loads(response.content)
                         data = json_data.get("keywordList", [])
                         
                         if data and len(data) > 0:
@@ -158,90 +293,184 @@ class NaverKeywordAPI:
                         return None
                         
                     except json.JSONDecodeError:
+                        backoff_wait(attempt, mode_config)
                         continue
                         
                 elif response.status_code == 403:
-                    wait_time = mode_config['wait_between_retries'][min(attempt, len(mode_config['wait_between_retries'])-1)]
-                    time.sleep(wait_time)
+                    backoff_wait(attempt, mode_config)
                     continue
                     
                 elif response.status_code == 429:
-                    wait_time = mode_config['wait_between_retries'][min(attempt, len(mode_config['wait_between_retries'])-1)]
-                    time.sleep(wait_time)
+                    backoff_wait(attempt, mode_config)
                     continue
                     
                 elif response.status_code == 401:
                     return None
                     
                 else:
+                    backoff_wait(attempt, mode_config)
                     continue
                     
-            except requests.exceptions.Timeout:
+            except httpx.TimeoutException:
+                backoff_wait(attempt, mode_config)
                 continue
                 
             except Exception as e:
+                backoff_wait(attempt, mode_config)
                 continue
         
         # 모든 재시도 실패
         return None
     
-    def fetch_bid_data(self, keyword: str, mode_config: dict) -> Dict:
-        """입찰가 데이터 조회 (간소화된 로그)"""
+    def fetch_bid_data_batch(self, cleaned_keywords: List[str], mode_config: dict, bucket: TokenBucket) -> Tuple[Dict[str, Dict], Dict[str, bool], bool]:
+        """입찰가 데이터 일괄 조회 (디바이스별 1회 요청, 정제된 키워드 기준) -> (결과, 키워드별 성공 여부, 인증 오류 여부)"""
         uri = '/estimate/average-position-bid/keyword'
         
-        def fetch_device_bid(device: str) -> Dict:
-            # 요청 간격 제어
-            time.sleep(1.0 / mode_config['calls_per_second'])
+        # 중복 제거
+        clean_kws = list(dict.fromkeys(kw for kw in cleaned_keywords if kw))
+        
+        def request_device_bid(device: str, kws: List[str]) -> Tuple[Optional[int], Optional[List]]:
+            """디바이스별 입찰가 요청 (재시도 포함) -> (상태 코드, estimate 목록 또는 None)"""
+            items = [{'key': kw, 'position': pos} for kw in kws for pos in BID_POSITIONS]
+            body = {'device': device, 'items': items}
             
-            timestamp = str(int(time.time() * 1000))
-            signature = self.generate_signature('POST', uri, timestamp)
+            # 재시도 로직
+            status_code = None
+            for attempt in range(mode_config['retry_count']):
+                try:
+                    # 요청 간격 제어
+                    bucket.consume(1)
+                    
+                    timestamp = str(int(time.time() * 1000))
+                    signature = self.generate_signature('POST', uri, timestamp)
+                    
+                    # 고정 헤더는 세션에 설정되어 있으므로 요청별 값만 전달
+                    headers = {
+                        'X-Timestamp': timestamp,
+                        'X-Signature': signature
+                    }
+                    
+                    response = self.session.post(
+                        BASE_URL + uri,
+                        headers=headers,
+                        content=_json_dumps(body),
+                        timeout=mode_config['timeout']
+                    )
+                    status_code = response.status_code
+                    
+                    if response.status_code == 200:
+                        json_data = _json_loads(response.content)
+                        return status_code, json_data.get('estimate', [])
+                    
+                    # 403/429 는 호출 제한이므로 재시도, 그 외 4xx 는 재시도해도 실패
+                    elif 400 <= response.status_code < 500 and response.status_code not in (403, 429):
+                        break
+                    
+                    else:
+                        backoff_wait(attempt, mode_config)
+                        continue
+                        
+                except Exception as e:
+                    backoff_wait(attempt, mode_config)
+                    continue
             
-            headers = {
-                'Content-Type': 'application/json; charset=UTF-8',
-                'X-Timestamp': timestamp,
-                'X-API-KEY': self.access_key,
-                'X-Customer': self.customer_id,
-                'X-Signature': signature,
-                'User-Agent': USER_AGENT,
-                'Accept': 'application/json'
-            }
+            return status_code, None
+        
+        def order_confirmed(kws: List[str], requested: List[Tuple[str, int]], estimates: List) -> bool:
+            """응답이 요청 items 와 같은 순서인지 확인 (응답의 순위/키워드는 확인용으로만 사용)"""
+            if len(estimates) != len(requested):
+                return False
+            for (kw, pos), item in zip(requested, estimates):
+                if item.get('position', pos) != pos:
+                    return False
+                echoed = item.get('keyword') or item.get('key')
+                if len(kws) > 1 and echoed and _normalize_echo(echoed) != _normalize_echo(kw):
+                    return False
+            return True
+        
+        def pair_estimates(device: str, kws: List[str], estimates: List) -> Dict[str, Dict]:
+            """estimate 를 요청 키워드/순위에 대응"""
+            col_by_pos = _BID_COL_BY_POSITION[device]
+            requested = [(kw, pos) for kw in kws for pos in BID_POSITIONS]
             
-            clean_kw = self.clean_keyword(keyword)
-            if not clean_kw:
-                return {f"{device} {pos}위": None for pos in [1, 2, 3, 4, 5]}
+            # 형식이 잘못된 항목은 제외 (제외되면 순서 확인 실패로 처리)
+            if not isinstance(estimates, list):
+                estimates = []
+            estimates = [item for item in estimates if isinstance(item, dict)]
             
-            items = [{'key': clean_kw, 'position': pos} for pos in [1, 2, 3, 4, 5]]
-            body = {'device': device, 'items': items}
+            # 요청 items 순서대로 대응
+            if order_confirmed(kws, requested, estimates):
+                result = {}
+                for (kw, pos), item in zip(requested, estimates):
+                    result.setdefault(kw, {})[col_by_pos[pos]] = item.get('bid')
+                return result
             
-            try:
-                response = self.session.post(
-                    BASE_URL + uri,
-                    headers=headers,
-                    json=body,
-                    timeout=mode_config['timeout'],
-                    verify=True
-                )
-                
-                if response.status_code == 200:
-                    json_data = response.json()
-                    estimates = json_data.get('estimate', [])
-                    result = {}
-                    for item in estimates:
-                        pos = item.get('position')
-                        bid = item.get('bid')
-                        result[f"{device} {pos}위"] = bid
-                    return result
-                    
-            except Exception as e:
-                pass
+            # 순서를 확인할 수 없으면 (키워드, 순위) 기준으로 분배 (키워드 1개면 순위만 사용)
+            kw_by_echo = {_normalize_echo(kw): kw for kw in kws}
+            result = {}
+            for item in estimates:
+                if len(kws) == 1:
+                    kw = kws[0]
+                else:
+                    echoed = item.get('keyword') or item.get('key')
+                    kw = kw_by_echo.get(_normalize_echo(echoed)) if echoed else None
+                column_name = col_by_pos.get(item.get('position'))
+                if kw and column_name:
+                    result.setdefault(kw, {})[column_name] = item.get('bid')
+            return result
+        
+        def fetch_device_bid(device: str, kws: List[str]) -> Tuple[Dict[str, Optional[int]], Dict[str, Dict]]:
+            """디바이스별 입찰가 조회 -> (키워드별 최종 상태 코드, 키워드별 입찰가)"""
+            if not kws:
+                return {}, {}
             
-            return {f"{device} {pos}위": None for pos in [1, 2, 3, 4, 5]}
+            status_code, estimates = request_device_bid(device, kws)
+            if estimates is not None:
+                try:
+                    return dict.fromkeys(kws, status_code), pair_estimates(device, kws, estimates)
+                except Exception as e:
+                    # 응답 해석 실패가 전체 조회를 중단시키지 않도록 빈 결과 반환 (실패로 기록)
+                    return dict.fromkeys(kws), {kw: _EMPTY_BIDS[device] for kw in kws}
+            
+            # 잘못된 키워드(400)가 아니면 묶음 전체 실패
+            if status_code != 400 or len(kws) == 1:
+                return dict.fromkeys(kws, status_code), {kw: _EMPTY_BIDS[device] for kw in kws}
+            
+            # 400: 묶음을 나눠 나머지 키워드의 입찰가는 유지
+            mid = len(kws) // 2
+            left_statuses, left = fetch_device_bid(device, kws[:mid])
+            right_statuses, right = fetch_device_bid(device, kws[mid:])
+            left_statuses.update(right_statuses)
+            left.update(right)
+            return left_statuses, left
+        
+        pc_statuses, pc_bids = fetch_device_bid('PC', clean_kws)
+        
+        # 인증 오류(401)는 재시도로 해결되지 않으므로 MOBILE 요청 생략 (403 은 호출 제한이므로 제외)
+        auth_failed = 401 in pc_statuses.values()
+        if auth_failed:
+            # 읽기 전용 공용 객체를 공유 (호출 측은 update 로 복사만 함)
+            mobile_statuses = dict.fromkeys(clean_kws)
+            mobile_bids = {clean_kw: _EMPTY_BIDS['MOBILE'] for clean_kw in clean_kws}
+        else:
+            mobile_statuses, mobile_bids = fetch_device_bid('MOBILE', clean_kws)
         
         bid_results = {}
-        bid_results.update(fetch_device_bid('PC'))
-        bid_results.update(fetch_device_bid('MOBILE'))
-        
-        return bid_results
+        bid_complete = {}
+        for clean_kw in clean_kws:
+            bid_info = {}
+            bid_info.update(pc_bids.get(clean_kw, {}))
+            bid_info.update(mobile_bids.get(clean_kw, {}))
+            bid_results[clean_kw] = bid_info
+            # PC/MOBILE 요청이 모두 성공한 키워드만 완전한 결과로 표시
+            bid_complete[clean_kw] = pc_statuses.get(clean_kw) == 200 and mobile_statuses.get(clean_kw) == 200
+        
+        return bid_results, bid_complete, auth_failed
+
+@st.cache_resource(ttl=API_CLIENT_TTL, max_entries=API_CLIENT_MAX_ENTRIES)
+def get_api(customer_id: str, access_key: str, secret_key: str) -> NaverKeywordAPI:
+    """API 객체 재사용 (재실행 간 HTTP 연결 유지, 인증 정보별로 분리)"""
+    return NaverKeywordAPI(customer_id, access_key, secret_key)
 
 def safe_get_number(value, default=0):
     """안전한 숫자 변환 (tkinter 버전과 동일)"""
@@ -257,99 +486,201 @@ def safe_get_number(value, default=0):
             elif '>' in value:
                 value = value.split('>')[-1].strip()
             
-            clean_value = ''.join(c for c in value if c.isdigit() or c == '.')
+            clean_value = ''.join(_NUM_RE.findall(value))
             return int(float(clean_value)) if clean_value else default
     except:
         pass
     
     return default
 
-def safe_format_number(value):
-    """안전한 숫자 포맷팅"""
-    num = safe_get_number(value, 0)
-    return f"{num:,}"
-
-def safe_format_percentage(value):
-    """안전한 퍼센티지 포맷팅"""
-    if value is None:
-        return "0.00%"
-    if isinstance(value, (int, float)):
-        return f"{round(value * 100, 2):.2f}%"
-    return "0.00%"
-
-def safe_format_bid(bid):
-    """입찰가 포맷팅 (tkinter 버전과 동일)"""
-    if bid is None or bid == "" or bid == 0:
-        return "-"
-    try:
-        if isinstance(bid, (int, float)):
-            return f"{int(bid):,}" if bid > 0 else "-"
-        bid_str = str(bid).replace(',', '').replace(' ', '')
-        if bid_str.replace('.', '', 1).replace('-', '', 1).isdigit():
-            return f"{int(float(bid_str)):,}"
-        return "-"
-    except:
-        return "-"
-
-def process_single_keyword(keyword: str, api: NaverKeywordAPI, mode_config: dict, idx: int, total: int) -> Optional[Dict]:
-    """단일 키워드 처리 (간소화된 로그)"""
+def process_single_keyword(keyword: str, kw_item: Optional[Dict], bid_info_dict: Dict) -> Optional[Dict]:
+    """단일 키워드 결과 행 생성 (포맷팅 전 원본 값)"""
     try:
-        # 키워드 데이터 조회
-        kw_item = api.fetch_keyword_data(keyword, mode_config)
-        
         if not kw_item:
             return None
         
-        # 입찰가 데이터 조회
-        bid_info_dict = api.fetch_bid_data(keyword, mode_config)
-        
         # 데이터 처리
         pc_cnt = safe_get_number(kw_item.get("monthlyPcQcCnt"))
         mob_cnt = safe_get_number(kw_item.get("monthlyMobileQcCnt"))
-        total_cnt = pc_cnt + mob_cnt
+        pc_ctr = kw_item.get('monthlyAvePcCtr')
+        mob_ctr = kw_item.get('monthlyAveMobileCtr')
         
         row = {
             "키워드": str(keyword),
-            "PC 검색량": safe_format_number(pc_cnt),
-            "모바일 검색량": safe_format_number(mob_cnt),
-            "총 검색량": safe_format_number(total_cnt),
-            "PC 클릭률": safe_format_percentage(kw_item.get('monthlyAvePcCtr')),
-            "모바일 클릭률": safe_format_percentage(kw_item.get('monthlyAveMobileCtr')),
+            "PC 검색량": pc_cnt,
+            "모바일 검색량": mob_cnt,
+            "총 검색량": pc_cnt + mob_cnt,
+            "PC 클릭률": pc_ctr if isinstance(pc_ctr, (int, float)) else None,
+            "모바일 클릭률": mob_ctr if isinstance(mob_ctr, (int, float)) else None,
             "경쟁도": str(kw_item.get("compIdx", "-"))
         }
         
         # 입찰가 데이터 추가
-        for device in ['PC', 'MOBILE']:
-            for pos in [1, 2, 3, 4, 5]:
-                column_name = f"{device} {pos}위"
-                bid_value = bid_info_dict.get(column_name, None)
-                row[column_name] = safe_format_bid(bid_value)
+        for column_name in BID_COLS:
+            row[column_name] = bid_info_dict.get(column_name, None)
         
         return row
         
     except Exception as e:
         return None
 
+def format_results(results: List[Dict]) -> pd.DataFrame:
+    """결과 행을 표시용 DataFrame 으로 변환 (컬럼 단위 포맷팅)"""
+    df = pd.DataFrame(results, columns=list(RESULT_COLS))
+    
+    # 검색량: 천 단위 구분
+    for col in ["PC 검색량", "모바일 검색량", "총 검색량"]:
+        df[col] = df[col].map('{:,}'.format)
+    
+    # 클릭률: 백분율 (값이 없으면 0.00%)
+    for col in ["PC 클릭률", "모바일 클릭률"]:
+        ctr = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        df[col] = ctr.mul(100).map('{:.2f}%'.format)
+    
+    # 입찰가: 0 이하 또는 값이 없으면 "-"
+    for col in BID_COLS:
+        bid = pd.to_numeric(df[col], errors='coerce')
+        bid = bid.where(bid > 0) // 1
+        df[col] = bid.map('{:,.0f}'.format, na_action='ignore').fillna("-")
+    
+    return df
+
+def build_excel(df: pd.DataFrame, failed_keywords: List[str]) -> bytes:
+    """엑셀 파일 생성 (constant_memory: 행 단위로 바로 기록해 셀 객체를 쌓지 않음)"""
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False
+    })
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+    
+    # constant_memory 모드는 행 순서대로 기록해야 하므로 to_excel 대신 직접 기록
+    sheet = workbook.add_worksheet('키워드 조회 결과')
+    sheet.write_row(0, 0, list(df.columns), header_format)
+    for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        sheet.write_row(row_idx, 0, row)
+    
+    # 실패 키워드도 추가
+    if failed_keywords:
+        failed_sheet = workbook.add_worksheet('실패 키워드')
+        failed_sheet.write(0, 0, '실패한 키워드', header_format)
+        for row_idx, keyword in enumerate(failed_keywords, start=1):
+            failed_sheet.write_string(row_idx, 0, keyword)
+    
+    workbook.close()
+    return output.getvalue()
+
+def raw_results_frame(results: List[Dict]) -> pd.DataFrame:
+    """원본 값(정수/실수/결측) 그대로의 DataFrame (분석용 CSV/Parquet)"""
+    df = pd.DataFrame(results, columns=list(RESULT_COLS)).convert_dtypes()
+    # 입찰가가 모두 비어 있어도 정수 컬럼 유지 (원 단위, 소수점 이하 버림)
+    for col in BID_COLS:
+        df[col] = (pd.to_numeric(df[col], errors='coerce') // 1).astype('Int64')
+    return df
+
+def build_csv(results: List[Dict]) -> bytes:
+    """CSV 파일 생성 (엑셀에서 한글이 깨지지 않도록 BOM 포함)"""
+    return raw_results_frame(results).to_csv(index=False).encode('utf-8-sig')
+
+def build_parquet(results: List[Dict]) -> bytes:
+    """Parquet 파일 생성 (컬럼 단위 압축)"""
+    output = io.BytesIO()
+    raw_results_frame(results).to_parquet(output, engine='pyarrow', compression='zstd', index=False)
+    return output.getvalue()
+
 def search_keywords(keywords: List[str], api: NaverKeywordAPI, speed_mode: int):
     """키워드 검색 메인 함수"""
     mode_config = SPEED_MODES[speed_mode]
-    total_keywords = len(keywords)
     
-    results = []
-    failed_keywords = []
+    # 모든 작업자가 하나의 호출 한도를 공유
+    bucket = TokenBucket(mode_config['calls_per_second'], mode_config['calls_per_second'])
     
-    # 진행률 표시
+    # 진행률 표시 (UI 갱신은 UI_UPDATE_INTERVAL 초에 한 번으로 제한)
     progress_bar = st.progress(0)
     status_text = st.empty()
+    last_ui_update = 0.0
     
-    for idx, keyword in enumerate(keywords):
-        # 진행률 업데이트
-        progress = (idx + 1) / total_keywords
-        progress_bar.progress(progress)
-        status_text.text(f"진행률: {(idx + 1)}/{total_keywords} ({progress*100:.1f}%) - 현재: '{keyword}'")
+    def update_progress(progress: float, message: str, force: bool = False):
+        nonlocal last_ui_update
+        now = time.monotonic()
+        if force or now - last_ui_update >= UI_UPDATE_INTERVAL:
+            progress_bar.progress(progress)
+            status_text.text(message)
+            last_ui_update = now
+    
+    # 키워드는 한 번만 정제해 두 단계에서 함께 사용
+    cleaned_keywords = [api.clean_keyword(keyword) for keyword in keywords]
+    
+    # 최근 조회 결과 재사용 (계정별 캐시)
+    # 정제 결과가 같은 입력은 한 번만 조회하고 결과를 함께 사용
+    cache = get_result_cache()
+    kw_items = {}
+    bid_info = {}
+    pending = []
+    for cleaned_keyword in dict.fromkeys(cleaned_keywords):
+        hit = cache.get((api.account_hash, cleaned_keyword))
+        if hit:
+            kw_items[cleaned_keyword], bid_info[cleaned_keyword] = hit
+        else:
+            pending.append(cleaned_keyword)
+    total_pending = len(pending)
+    
+    # 진행률 분모: 키워드 조회 + 입찰가 묶음 조회
+    total_steps = max(1, total_pending + math.ceil(total_pending / BID_BATCH_SIZE))
+    
+    with ThreadPoolExecutor(max_workers=mode_config['max_concurrency']) as executor:
+        # 1단계: 키워드 데이터 조회
+        futures = {
+            executor.submit(api.fetch_keyword_data, cleaned_keyword, mode_config, bucket): cleaned_keyword
+            for cleaned_keyword in pending
+        }
         
-        # 키워드 처리
-        result = process_single_keyword(keyword, api, mode_config, idx, total_keywords)
+        for done, future in enumerate(as_completed(futures), start=1):
+            cleaned_keyword = futures[future]
+            kw_items[cleaned_keyword] = future.result()
+            
+            # 진행률 업데이트 (streamlit 호출은 메인 스레드에서만)
+            progress = done / total_steps
+            update_progress(
+                progress,
+                f"진행률: {done}/{total_pending} ({progress*100:.1f}%) - 완료: '{cleaned_keyword}'",
+                force=(done == total_pending)
+            )
+        
+        # 2단계: 조회된 키워드의 입찰가를 묶음 단위로 조회
+        found_keywords = [cleaned_keyword for cleaned_keyword in pending if kw_items[cleaned_keyword]]
+        batches = [found_keywords[i:i + BID_BATCH_SIZE] for i in range(0, len(found_keywords), BID_BATCH_SIZE)]
+        futures = [executor.submit(api.fetch_bid_data_batch, batch, mode_config, bucket) for batch in batches]
+        bid_auth_failed = False
+        bid_complete = {}
+        
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch_bids, batch_complete, batch_auth_failed = future.result()
+            bid_info.update(batch_bids)
+            bid_complete.update(batch_complete)
+            bid_auth_failed = bid_auth_failed or batch_auth_failed
+            
+            progress = (total_pending + done) / total_steps
+            update_progress(
+                progress,
+                f"입찰가 조회: {done}/{len(batches)} 묶음 ({progress*100:.1f}%)",
+                force=(done == len(batches))
+            )
+    
+    if bid_auth_failed:
+        st.warning("⚠️ 입찰가 조회 인증 오류(401)로 일부 입찰가를 가져오지 못했습니다. API 설정을 확인해주세요.")
+    
+    # 새로 조회된 결과 캐시 (PC/MOBILE 입찰가 조회가 모두 성공한 키워드만)
+    for cleaned_keyword in pending:
+        if kw_items[cleaned_keyword] and bid_complete.get(cleaned_keyword):
+            cache.set((api.account_hash, cleaned_keyword), (kw_items[cleaned_keyword], bid_info.get(cleaned_keyword, {})))
+    
+    results = []
+    failed_keywords = []
+    
+    for keyword, cleaned_keyword in zip(keywords, cleaned_keywords):
+        result = process_single_keyword(keyword, kw_items[cleaned_keyword], bid_info.get(cleaned_keyword, {}))
         
         if result:
             results.append(result)
@@ -432,10 +763,8 @@ def main():
         
         # 키워드 개수 표시
         if keyword_input.strip():
-            keywords = [line.strip() for line in keyword_input.strip().split('\n') if line.strip()]
-            # 중복 제거
-            seen = set()
-            keywords_unique = [x for x in keywords if x not in seen and not seen.add(x)]
+            # 중복 제거 (입력 순서 유지)
+            keywords_unique = list(dict.fromkeys(line.strip() for line in keyword_input.strip().split('\n') if line.strip()))
             st.info(f"📊 입력된 키워드: {len(keywords_unique)}개 (중복 제거됨)")
     
     with col2:
@@ -452,22 +781,14 @@ def main():
             if not keyword_input.strip():
                 st.error("❌ 키워드를 입력해주세요!")
             else:
-                keywords_raw = [line.strip() for line in keyword_input.strip().split('\n') if line.strip()]
-                
-                # 키워드 전처리 및 중복 제거
-                seen = set()
-                keywords_processed = []
-                
-                for kw in keywords_raw:
-                    if kw not in seen:
-                        seen.add(kw)
-                        keywords_processed.append(kw)
+                # 키워드 전처리 및 중복 제거 (입력 순서 유지)
+                keywords_processed = list(dict.fromkeys(line.strip() for line in keyword_input.strip().split('\n') if line.strip()))
                 
                 if not keywords_processed:
                     st.error("❌ 유효한 키워드가 없습니다!")
                 else:
-                    # API 객체 생성
-                    api = NaverKeywordAPI(customer_id, access_key, secret_key)
+                    # API 객체 (캐시된 연결 재사용)
+                    api = get_api(customer_id, access_key, secret_key)
                     
                     # 키워드 처리
                     mode_info = SPEED_MODES[speed_mode]
@@ -502,49 +823,46 @@ def main():
             st.metric("조회 시간", st.session_state.get('last_search_time', '-'))
         
         # 결과 테이블
-        df = pd.DataFrame(st.session_state.results)
+        df = format_results(st.session_state.results)
         
-        # 컬럼 순서 정렬
-        ordered_cols = [
-            "키워드", "PC 검색량", "모바일 검색량", "총 검색량",
-            "PC 클릭률", "모바일 클릭률", "경쟁도",
-            "PC 1위", "PC 2위", "PC 3위", "PC 4위", "PC 5위",
-            "MOBILE 1위", "MOBILE 2위", "MOBILE 3위", "MOBILE 4위", "MOBILE 5위"
-        ]
+        st.dataframe(df, use_container_width=True, height=400)
         
-        df_cols = [col for col in ordered_cols if col in df.columns]
-        df = df[df_cols]
+        # 다운로드 (엑셀 기본, CSV/Parquet 는 대용량용 빠른 형식)
+        col1, col2, col3, col4 = st.columns([1, 1, 1, 3])
         
-        st.dataframe(df, use_container_width=True, height=400)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        success_rate_str = f"{success_rate:.0f}percent" if 'success_rate' in locals() else "result"
+        file_base = f"naver_keywords_{success_rate_str}_{timestamp}"
+        failed_keywords = st.session_state.get('failed_keywords', [])
         
-        # 엑셀 다운로드
-        col1, col2 = st.columns([1, 3])
+        # 엑셀은 표시용 값, CSV/Parquet 는 원본 값 사용 (다운로드 시에만 변환)
         
+        # 파일은 버튼을 눌렀을 때만 생성
         with col1:
-            # 엑셀 파일 생성
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='키워드 조회 결과', index=False)
-                
-                # 실패 키워드도 추가
-                if st.session_state.get('failed_keywords'):
-                    failed_df = pd.DataFrame({'실패한 키워드': st.session_state.failed_keywords})
-                    failed_df.to_excel(writer, sheet_name='실패 키워드', index=False)
-            
-            excel_data = output.getvalue()
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            success_rate_str = f"{success_rate:.0f}percent" if 'success_rate' in locals() else "result"
-            filename = f"naver_keywords_{success_rate_str}_{timestamp}.xlsx"
-            
             st.download_button(
                 label="📂 엑셀 다운로드",
-                data=excel_data,
-                file_name=filename,
+                data=partial(build_excel, df, failed_keywords),
+                file_name=f"{file_base}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 type="primary"
             )
         
+        with col2:
+            st.download_button(
+                label="📄 CSV 다운로드",
+                data=partial(build_csv, st.session_state.results),
+                file_name=f"{file_base}.csv",
+                mime="text/csv"
+            )
+        
+        with col3:
+            st.download_button(
+                label="🗜️ Parquet 다운로드",
+                data=partial(build_parquet, st.session_state.results),
+                file_name=f"{file_base}.parquet",
+                mime="application/vnd.apache.parquet"
+            )
+        
         # 실패 키워드 표시
         if st.session_state.get('failed_keywords'):
             with st.expander(f"❌ 실패한 키워드 ({len(st.session_state.failed_keywords)}개)"):